@@ -4,18 +4,55 @@ Ollama Benchmark with Automated LLM Scoring
 
 This script benchmarks multiple Ollama models on reasoning, coding, and logic tasks,
 using another LLM as an automated judge to score the responses.
+
+Timed generations run strictly one at a time, so tokens/sec and durations are
+measured without contention and stay comparable between server configurations.
+Only judge calls, which are not timed, are issued concurrently. For best
+throughput, start the server with:
+
+    OLLAMA_NUM_PARALLEL       Requests each loaded model serves at once (e.g. 3,
+                              so several judge calls can run together)
+    OLLAMA_MAX_LOADED_MODELS  Models kept in memory at once (e.g. 2, so the
+                              judge can stay loaded next to the model under test)
+
+    OLLAMA_NUM_PARALLEL=3 OLLAMA_MAX_LOADED_MODELS=2 ollama serve
+
+The script reads both variables from its own environment too. It cannot see the
+server's settings, so export the same values to both. OLLAMA_NUM_PARALLEL
+(default 3) sets how many judge calls run at once. When OLLAMA_MAX_LOADED_MODELS
+is 2 or more, each model is judged while the next one generates, so one generation
+runs on top of those judge calls; otherwise all responses are generated first and
+then judged, so the judge is loaded only once.
+Note that unset here means "1" to the script, even though Ollama's own default
+lets it keep more than one model loaded.
+
+Overlapping saves wall-clock time but costs measurement accuracy: the judge then
+shares the GPU with the model being timed, so that model's reported tokens/sec
+drops and its durations grow. Leave OLLAMA_MAX_LOADED_MODELS unset (or 1) in the
+script's environment when the speed numbers matter.
+
+Pass --skip-slow to give up on generations that take far longer than those seen so
+far in the run, instead of waiting up to GENERATE_TIMEOUT for a wedged model. The
+rest of that model's tests are then skipped and the run moves on to the next model.
 """
 
+import argparse
+import asyncio
+import csv
+import hashlib
+import heapq
+import itertools
 import json
+import math
 import os
-import re
+import statistics
 import sys
-import time
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
-import requests
+import aiohttp
+import orjson
 
 # ═══════════════════════════════════════════════════════════════
 # CONFIGURATION
@@ -44,6 +81,82 @@ OLLAMA_URL = "http://localhost:11434/api/generate"
 # Timeouts (in seconds)
 GENERATE_TIMEOUT = 600
 JUDGE_TIMEOUT = 120
+WARMUP_TIMEOUT = 120
+
+# With --skip-slow, generations time out after SLOW_TIMEOUT_FACTOR x the 95th
+# percentile duration seen so far (never below SLOW_TIMEOUT_MIN or above GENERATE_TIMEOUT)
+SLOW_TIMEOUT_FACTOR = 10
+SLOW_TIMEOUT_MIN = 60
+
+# Judge sampling options: deterministic, with output capped per verdict in a batch
+JUDGE_OPTIONS = {"temperature": 0, "top_p": 1.0, "seed": 42}
+JUDGE_TOKENS_PER_VERDICT = 150
+
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer environment variable, falling back to default if unset or not a number."""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Overlap judging with generation only if Ollama can hold the judge and a test model at once.
+# This shortens the run but skews the measured speed of the model generating meanwhile.
+OVERLAP_JUDGING = env_int("OLLAMA_MAX_LOADED_MODELS", 1) >= 2
+
+# Number of judge batches scored concurrently (match the server's OLLAMA_NUM_PARALLEL).
+# This bounds judge calls only; in overlap mode a generation runs alongside them.
+JUDGE_WORKERS = max(1, env_int("OLLAMA_NUM_PARALLEL", 3))
+
+# How long Ollama keeps the judge loaded after each judge call, so consecutive
+# batches don't reload it. This only spans gaps between judge calls, not a whole
+# generation phase.
+JUDGE_KEEP_ALIVE = "10m"
+
+# How long a test model stays loaded after its warm-up and after each of its tests
+MODEL_KEEP_ALIVE = "10m"
+
+# Detailed CSV columns: result key -> header name
+CSV_COLUMNS = {
+    "model": "Model",
+    "test": "Test",
+    "correctness": "Correctness",
+    "efficiency": "Efficiency",
+    "outcome": "Outcome",
+    "composite": "CompositeScore",
+    "tokens_per_sec": "TokensPerSecond",
+    "output_tokens": "OutputTokens",
+    "duration": "Duration",
+    "status": "Status",
+    "reasoning": "JudgeReasoning",
+}
+
+# Summary CSV columns: summary key -> header name
+SUMMARY_COLUMNS = {
+    "model": "Model",
+    "reasoning": "Reasoning",
+    "coding": "Coding",
+    "logic": "Logic",
+    "average": "Average",
+    "speed": "Tok/s",
+}
+
+# Maximum number of pooled keep-alive connections to Ollama
+HTTP_POOL_SIZE = 32
+
+# Shared HTTP session, opened by main() and reused by every Ollama call
+SESSION: Optional[aiohttp.ClientSession] = None
+
+# On-disk cache of judge verdicts, so re-runs skip responses already scored
+CACHE_PATH = Path(".judge_cache.json")
+JUDGE_CACHE: dict = {}
+
+# Part of every cache key; bump it when the batch prompt text in judge_batch() changes
+JUDGE_PROMPT_VERSION = 1
+
+# Serializes cache writes, so an older snapshot never replaces a newer one; created by main()
+CACHE_LOCK: Optional[asyncio.Lock] = None
 
 # ═══════════════════════════════════════════════════════════════
 # TEST PROMPTS AND CRITERIA
@@ -128,6 +241,33 @@ OUTCOME:
     }
 }
 
+# (test_name, test_data) pairs in run order, materialised once
+TESTS_ITEMS = list(TESTS.items())
+
+# Fixed part of each test's judge prompt block; only the model's response goes between
+# JUDGE_PREFIX[test_name] and JUDGE_SUFFIX
+JUDGE_PREFIX = {
+    test_name: f"""TASK: {test_name}
+
+ORIGINAL PROMPT GIVEN TO THE MODEL:
+{test_data['prompt']}
+
+EXPECTED ANSWER / KEY POINTS:
+{test_data['expected']}
+
+SCORING CRITERIA:
+{test_data['criteria']}
+
+MODEL'S RESPONSE TO EVALUATE:
+---
+"""
+    for test_name, test_data in TESTS_ITEMS
+}
+JUDGE_SUFFIX = """
+---
+
+"""
+
 # ═══════════════════════════════════════════════════════════════
 # COLORS FOR OUTPUT
 # ═══════════════════════════════════════════════════════════════
@@ -146,122 +286,179 @@ class Colors:
 # HELPER FUNCTIONS
 # ═══════════════════════════════════════════════════════════════
 
-def ollama_generate(model: str, prompt: str, timeout: int = GENERATE_TIMEOUT) -> dict:
+# JSON schema the judge's output is constrained to (one verdict per response)
+JUDGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdicts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "correctness": {"type": "integer"},
+                    "efficiency": {"type": "integer"},
+                    "outcome": {"type": "integer"},
+                    "reasoning": {"type": "string"}
+                },
+                "required": ["correctness", "efficiency", "outcome", "reasoning"]
+            }
+        }
+    },
+    "required": ["verdicts"]
+}
+
+
+async def ollama_generate(model: str, prompt: str, timeout: int = GENERATE_TIMEOUT,
+                          format: Optional[dict] = None,
+                          options: Optional[dict] = None,
+                          keep_alive: Optional[str] = None) -> dict:
     """
     Call the Ollama API to generate a response.
 
+    If format is given, it is passed to Ollama as a JSON schema the output must follow.
+    If options is given, it is passed as Ollama model options (temperature, num_predict, ...).
+    If keep_alive is given (e.g. "10m"), Ollama keeps the model loaded that long afterwards.
+
     Returns a dict with 'response', 'eval_count', 'eval_duration', 'total_duration'
-    or 'error' if something went wrong.
+    or 'error' if something went wrong ('timed_out' is also set if it timed out).
     """
+    body = {"model": model, "prompt": prompt, "stream": False}
+    if format is not None:
+        body["format"] = format
+    if options is not None:
+        body["options"] = options
+    if keep_alive is not None:
+        body["keep_alive"] = keep_alive
+
     try:
-        response = requests.post(
+        async with SESSION.post(
             OLLAMA_URL,
-            json={"model": model, "prompt": prompt, "stream": False},
-            timeout=timeout
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.Timeout:
-        return {"error": f"Request timed out after {timeout}s"}
-    except requests.exceptions.ConnectionError:
+            json=body,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            response.raise_for_status()
+            return orjson.loads(await response.read())
+    except asyncio.TimeoutError:
+        return {"error": f"Request timed out after {timeout}s", "timed_out": True}
+    except aiohttp.ClientConnectorError:
         return {"error": "Could not connect to Ollama. Is 'ollama serve' running?"}
-    except requests.exceptions.RequestException as e:
+    except aiohttp.ClientError as e:
         return {"error": str(e)}
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         return {"error": f"Invalid JSON response: {e}"}
 
 
-def get_auto_score(test_name: str, original_prompt: str, expected: str,
-                   criteria: str, model_response: str) -> dict:
+def load_judge_cache() -> dict:
+    """Load cached judge verdicts from CACHE_PATH, or an empty dict if unavailable."""
+    try:
+        return json.loads(CACHE_PATH.read_text())
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_judge_cache(cache: dict):
+    """Atomically write a snapshot of the judge cache to CACHE_PATH."""
+    tmp_path = CACHE_PATH.with_name(CACHE_PATH.name + ".tmp")
+    try:
+        tmp_path.write_text(json.dumps(cache))
+        os.replace(tmp_path, CACHE_PATH)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def judge_cache_key(test_name: str, response: str) -> str:
     """
-    Use the judge model to score a response.
+    Cache key for a judge verdict.
 
-    Returns a dict with 'correctness', 'efficiency', 'outcome', 'reasoning', 'raw_response'
+    Covers the judge model, its options, output schema and token budget, the test's
+    full rubric (task, prompt, expected answer, criteria) and the response. The batch
+    prompt text around the rubric is covered by JUDGE_PROMPT_VERSION instead.
     """
-    judge_prompt = f"""You are an expert evaluator scoring an AI model's response. Be strict but fair.
+    settings = json.dumps([JUDGE_PROMPT_VERSION, JUDGE_OPTIONS, JUDGE_SCHEMA, JUDGE_TOKENS_PER_VERDICT],
+                          sort_keys=True)
+    return hashlib.sha256(
+        f"{JUDGE_MODEL}|{settings}|{JUDGE_PREFIX[test_name]}{JUDGE_SUFFIX}|{response}".encode()
+    ).hexdigest()
 
-TASK: {test_name}
 
-ORIGINAL PROMPT GIVEN TO THE MODEL:
-{original_prompt}
+async def get_auto_scores_batch(items: list[dict]) -> list[dict]:
+    """
+    Score several responses, reusing cached verdicts where available.
 
-EXPECTED ANSWER / KEY POINTS:
-{expected}
+    Each item is a dict with 'test_name' and the model's 'response' to that test.
+    Returns one dict per item, in the same order, with 'correctness', 'efficiency',
+    'outcome', 'reasoning', 'raw_response'
+    """
+    keys = [judge_cache_key(item["test_name"], item["response"]) for item in items]
+    verdicts = {key: JUDGE_CACHE[key] for key in keys if key in JUDGE_CACHE}
+    pending = [(key, item) for key, item in zip(keys, items) if key not in verdicts]
+
+    if pending:
+        judged = await judge_batch([item for _, item in pending])
+        cached_new = False
+        for (key, _), scores in zip(pending, judged):
+            verdicts[key] = scores
+            # Only cache successfully parsed verdicts so failures are retried
+            if scores["correctness"] > 0:
+                JUDGE_CACHE[key] = scores
+                cached_new = True
+        if cached_new:
+            # Snapshot on the event loop, then write it out off the loop
+            async with CACHE_LOCK:
+                await asyncio.to_thread(save_judge_cache, dict(JUDGE_CACHE))
 
-SCORING CRITERIA:
-{criteria}
+    return [dict(verdicts[key]) for key in keys]
 
-MODEL'S RESPONSE TO EVALUATE:
----
-{model_response}
----
 
-Score the response on three dimensions. Be strict - only give 10 for truly excellent responses.
+async def judge_batch(items: list[dict]) -> list[dict]:
+    """
+    Use the judge model to score several responses in a single call.
+
+    Takes and returns items in the same form as get_auto_scores_batch().
+    """
+    if not items:
+        return []
+
+    blocks = "".join(
+        f"=== RESPONSE {i} ===\n\n" + JUDGE_PREFIX[item["test_name"]] + item["response"] + JUDGE_SUFFIX
+        for i, item in enumerate(items, 1)
+    )
 
-You MUST respond with ONLY a JSON object in this exact format, no other text:
-{{"correctness": <1-10>, "efficiency": <1-10>, "outcome": <1-10>, "reasoning": "<brief 1-2 sentence justification>"}}"""
+    judge_prompt = f"""You are an expert evaluator scoring an AI model's responses to {len(items)} separate tasks. Be strict but fair, and score each response independently.
 
-    result = ollama_generate(JUDGE_MODEL, judge_prompt, JUDGE_TIMEOUT)
+{blocks}Score each response on three dimensions. Be strict - only give 10 for truly excellent responses.
+
+You MUST respond with ONLY a JSON object holding {len(items)} verdicts, one per response in the order given, in this exact format, no other text:
+{{"verdicts": [{{"correctness": <1-10>, "efficiency": <1-10>, "outcome": <1-10>, "reasoning": "<brief 1-2 sentence justification>"}}, ...]}}"""
+
+    result = await ollama_generate(JUDGE_MODEL, judge_prompt, JUDGE_TIMEOUT * len(items),
+                                   format=JUDGE_SCHEMA,
+                                   options={**JUDGE_OPTIONS,
+                                            "num_predict": JUDGE_TOKENS_PER_VERDICT * len(items)},
+                                   keep_alive=JUDGE_KEEP_ALIVE)
 
     if "error" in result:
-        return {
+        return [{
             "correctness": 0,
             "efficiency": 0,
             "outcome": 0,
             "reasoning": f"Judge error: {result['error']}",
             "raw_response": result.get("error", "")
-        }
+        } for _ in items]
 
     judge_text = result.get("response", "")
 
     if not judge_text:
-        return {
+        return [{
             "correctness": 0,
             "efficiency": 0,
             "outcome": 0,
             "reasoning": "Judge returned empty response",
             "raw_response": ""
-        }
-
-    # Try to extract JSON from the response
-    # Look for a JSON object containing "correctness"
-    json_match = re.search(r'\{[^{}]*"correctness"[^{}]*\}', judge_text)
-
-    if json_match:
-        try:
-            scores = json.loads(json_match.group())
-            correctness = int(scores.get("correctness", 0))
-            efficiency = int(scores.get("efficiency", 0))
-            outcome = int(scores.get("outcome", 0))
-            reasoning = scores.get("reasoning", "No reasoning provided")
-
-            # Clamp values between 1 and 10
-            correctness = max(1, min(10, correctness)) if correctness > 0 else 0
-            efficiency = max(1, min(10, efficiency)) if efficiency > 0 else 0
-            outcome = max(1, min(10, outcome)) if outcome > 0 else 0
-
-            return {
-                "correctness": correctness,
-                "efficiency": efficiency,
-                "outcome": outcome,
-                "reasoning": reasoning,
-                "raw_response": judge_text
-            }
-        except (json.JSONDecodeError, ValueError, TypeError):
-            pass
-
-    # Fallback: try to extract any numbers
-    numbers = re.findall(r'\b([1-9]|10)\b', judge_text)
-    if len(numbers) >= 3:
-        return {
-            "correctness": int(numbers[0]),
-            "efficiency": int(numbers[1]),
-            "outcome": int(numbers[2]),
-            "reasoning": "Extracted from non-JSON response",
-            "raw_response": judge_text
-        }
+        } for _ in items]
 
-    return {
+    unparsed = {
         "correctness": 0,
         "efficiency": 0,
         "outcome": 0,
@@ -269,6 +466,45 @@ You MUST respond with ONLY a JSON object in this exact format, no other text:
         "raw_response": judge_text
     }
 
+    # The response is constrained to JUDGE_SCHEMA, so it can be parsed directly
+    try:
+        raw_verdicts = orjson.loads(judge_text)["verdicts"]
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        return [dict(unparsed) for _ in items]
+
+    # Servers that don't enforce the schema may return any shape here
+    if not isinstance(raw_verdicts, list):
+        return [dict(unparsed) for _ in items]
+
+    verdicts = []
+    for scores in raw_verdicts[:len(items)]:
+        try:
+            verdicts.append({
+                "correctness": clamp_score(scores.get("correctness", 0)),
+                "efficiency": clamp_score(scores.get("efficiency", 0)),
+                "outcome": clamp_score(scores.get("outcome", 0)),
+                "reasoning": scores.get("reasoning", "No reasoning provided"),
+                "raw_response": judge_text
+            })
+        except (AttributeError, ValueError, TypeError):
+            verdicts.append(dict(unparsed))
+
+    return verdicts + [dict(unparsed) for _ in range(len(items) - len(verdicts))]
+
+
+def adaptive_timeout(durations: list[float]) -> int:
+    """Timeout in whole seconds for the next generation, based on the durations (in seconds) seen so far."""
+    if not durations:
+        return GENERATE_TIMEOUT
+    p95 = statistics.quantiles(durations, n=20, method="inclusive")[-1] if len(durations) > 1 else durations[0]
+    return min(GENERATE_TIMEOUT, max(SLOW_TIMEOUT_MIN, math.ceil(SLOW_TIMEOUT_FACTOR * p95)))
+
+
+def clamp_score(value) -> int:
+    """Clamp a judge score to 1-10, or 0 if it is missing or not positive."""
+    value = int(value or 0)
+    return 0 if value <= 0 else min(value, 10)
+
 
 def calculate_tokens_per_sec(eval_count: int, eval_duration: int) -> float:
     """Calculate tokens per second from Ollama metrics."""
@@ -290,82 +526,74 @@ def print_score(composite: float, correctness: int, efficiency: int,
     print(f" {color}Score: {composite:.1f}/10 (C:{correctness} E:{efficiency} O:{outcome}) | {tokens_per_sec} tok/s{Colors.NC}")
 
 
-# ═══════════════════════════════════════════════════════════════
-# MAIN EXECUTION
-# ═══════════════════════════════════════════════════════════════
+def record_result(result: dict, writer: csv.DictWriter, model_scores: dict):
+    """Write a result row to the detailed CSV and add it to the model's summary scores."""
+    writer.writerow(result)
 
-def main():
-    # Create output directory
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_dir = Path(f"benchmark_auto_{timestamp}")
-    output_dir.mkdir(exist_ok=True)
+    if result["status"] != "ERROR":
+        model_scores[result["model"]]["speeds"].append(result["tokens_per_sec"])
+    if result["status"] == "OK":
+        model_scores[result["model"]][result["test"]] = result["composite"]
 
-    # Initialize results
-    results = []
-    model_scores = {model: {"Reasoning": 0, "Coding": 0, "Logic": 0, "speeds": []}
-                    for model in MODELS}
 
-    # Print header
-    print()
-    print(f"{Colors.CYAN}╔═══════════════════════════════════════════════════════════════╗{Colors.NC}")
-    print(f"{Colors.CYAN}║       OLLAMA BENCHMARK WITH AUTOMATED LLM SCORING             ║{Colors.NC}")
-    print(f"{Colors.CYAN}╠═══════════════════════════════════════════════════════════════╣{Colors.NC}")
-    print(f"{Colors.CYAN}║  Judge Model: {JUDGE_MODEL:<45}║{Colors.NC}")
-    print(f"{Colors.CYAN}║  Models to test: {len(MODELS):<42}║{Colors.NC}")
-    print(f"{Colors.CYAN}║  Tests per model: 3 (Reasoning, Coding, Logic)                ║{Colors.NC}")
-    print(f"{Colors.CYAN}╚═══════════════════════════════════════════════════════════════╝{Colors.NC}")
-    print()
-    print(f"{Colors.GRAY}Output directory: {output_dir}{Colors.NC}")
-    print()
+def write_files(files: list[tuple[Path, str]]):
+    """Write each (path, text) pair to disk."""
+    for path, text in files:
+        path.write_text(text)
 
-    # Pre-flight check: verify judge model
-    print(f"{Colors.GRAY}Verifying judge model ({JUDGE_MODEL})...{Colors.NC}", end="", flush=True)
-    judge_check = ollama_generate(JUDGE_MODEL, "Say OK", 30)
 
-    if "error" in judge_check:
-        print(f" {Colors.RED}FAILED{Colors.NC}")
-        print()
-        print(f"{Colors.RED}ERROR: Judge model '{JUDGE_MODEL}' failed to respond.{Colors.NC}")
-        print(f"{Colors.RED}Reason: {judge_check['error']}{Colors.NC}")
-        print()
-        print("Possible solutions:")
-        print("  1. Restart Ollama: pkill ollama && ollama serve")
-        print(f"  2. Pull the model: ollama pull {JUDGE_MODEL}")
-        print("  3. Use a smaller judge model by editing JUDGE_MODEL in the script")
-        print()
-        sys.exit(1)
-
-    if not judge_check.get("response"):
-        print(f" {Colors.RED}FAILED{Colors.NC}")
-        print()
-        print(f"{Colors.RED}ERROR: Judge model returned empty response.{Colors.NC}")
-        sys.exit(1)
-
-    print(f" {Colors.GREEN}OK{Colors.NC}")
-    print()
+# ═══════════════════════════════════════════════════════════════
+# BENCHMARK PIPELINE
+# ═══════════════════════════════════════════════════════════════
 
+async def generate_responses(queue: asyncio.Queue, output_dir: Path, writer: csv.DictWriter,
+                             model_scores: dict, progress: itertools.count, skip_slow: bool = False) -> int:
+    """
+    Producer: generate every model's test responses and queue them for judging.
+
+    Each model is first warmed up with a one-token request, so its load time is not
+    counted in the measured runs. A model's tests are then generated one after
+    another, so each is timed without contending with the others or waiting in
+    Ollama's queue. Each test is reported as soon as it is generated, and failed
+    ones are recorded as ERROR rows straight away. Once a model is done, its
+    response files are saved and its successful generations are queued as one
+    (model, {test_name: (response_text, tokens_per_sec, eval_count, duration_sec)})
+    batch. Puts a None sentinel on the queue for each of the JUDGE_WORKERS
+    consumers once all models are done, and returns how many of the queued
+    responses have no cached verdict yet.
+
+    If skip_slow is set, each model's generations use adaptive_timeout() over the
+    durations seen so far. Once one of them exceeds it, that model's remaining
+    tests are recorded as errors without being run.
+    """
     total_tests = len(MODELS) * len(TESTS)
-    current_test = 0
+    durations = []
+    unjudged = 0
 
-    # Run benchmarks
     for model in MODELS:
-        print(f"{Colors.YELLOW}═══════════════════════════════════════════════════════════════{Colors.NC}")
-        print(f"{Colors.YELLOW} MODEL: {model}{Colors.NC}")
-        print(f"{Colors.YELLOW}═══════════════════════════════════════════════════════════════{Colors.NC}")
-
+        print(f"{Colors.YELLOW}Generating: {model}{Colors.NC}")
+        warmup = await ollama_generate(model, "ok", WARMUP_TIMEOUT, options={"num_predict": 1},
+                                       keep_alive=MODEL_KEEP_ALIVE)
+        if "error" in warmup:
+            print(f"{Colors.GRAY}  Warm-up failed ({warmup['error']}); its load time may count in the first test{Colors.NC}")
         safe_model_name = model.replace(":", "_").replace("/", "_")
-
-        for test_name, test_data in TESTS.items():
-            current_test += 1
-            print(f"  {Colors.WHITE}[{current_test}/{total_tests}] {test_name}{Colors.NC}", end="")
-            print(f"{Colors.GRAY} - Generating...{Colors.NC}", end="", flush=True)
-
-            # Generate response
-            response = ollama_generate(model, test_data["prompt"])
+        file_prefix = f"{output_dir / safe_model_name}_"
+        generated = {}
+        response_files = []
+        skipped = None
+
+        for test_name, test_data in TESTS_ITEMS:
+            if skipped:
+                response = {"error": skipped}
+            else:
+                timeout = adaptive_timeout(durations) if skip_slow else GENERATE_TIMEOUT
+                response = await ollama_generate(model, test_data["prompt"], timeout,
+                                                 keep_alive=MODEL_KEEP_ALIVE)
+                if skip_slow and response.get("timed_out"):
+                    skipped = f"Skipped after {test_name} timed out"
 
             if "error" in response:
-                print(f" {Colors.RED}ERROR: {response['error']}{Colors.NC}")
-                results.append({
+                record_result({
                     "model": model,
                     "test": test_name,
                     "correctness": 0,
@@ -377,7 +605,9 @@ def main():
                     "duration": 0,
                     "status": "ERROR",
                     "reasoning": response["error"]
-                })
+                }, writer, model_scores)
+                print(f"  {Colors.WHITE}[{next(progress)}/{total_tests}] {model} - {test_name}{Colors.NC}", end="")
+                print(f" {Colors.RED}ERROR: {response['error']}{Colors.NC}")
                 continue
 
             response_text = response.get("response", "")
@@ -387,45 +617,71 @@ def main():
 
             tokens_per_sec = calculate_tokens_per_sec(eval_count, eval_duration)
             duration_sec = round(total_duration / 1_000_000_000, 2) if total_duration else 0
+            if total_duration:
+                durations.append(total_duration / 1_000_000_000)
+
+            print(f"{Colors.GRAY}  {test_name}: {tokens_per_sec} tok/s, {duration_sec}s{Colors.NC}")
+
+            response_files.append((Path(f"{file_prefix}{test_name}_response.txt"), response_text))
+            generated[test_name] = (response_text, tokens_per_sec, eval_count, duration_sec)
+            if judge_cache_key(test_name, response_text) not in JUDGE_CACHE:
+                unjudged += 1
+
+        # Save this model's responses in one write off the event loop
+        await asyncio.to_thread(write_files, response_files)
+
+        if generated:
+            await queue.put((model, generated))
+
+    for _ in range(JUDGE_WORKERS):
+        await queue.put(None)
+
+    return unjudged
+
+
+async def judge_responses(queue: asyncio.Queue, output_dir: Path, writer: csv.DictWriter,
+                          model_scores: dict, progress: itertools.count):
+    """
+    Consumer: score queued responses, save their judge files and record the results.
+
+    All of a model's responses are scored with a single judge call, and each result
+    is written to the detailed CSV as soon as it is known. Several consumers may
+    share the queue; progress numbers the results across all of them.
+    Runs until it receives a None sentinel from generate_responses().
+    """
+    total_tests = len(MODELS) * len(TESTS)
 
-            model_scores[model]["speeds"].append(tokens_per_sec)
-
-            # Save response
-            response_file = output_dir / f"{safe_model_name}_{test_name}_response.txt"
-            response_file.write_text(response_text)
-
-            # Score the response
-            print(" Scoring...", end="", flush=True)
-            scores = get_auto_score(
-                test_name,
-                test_data["prompt"],
-                test_data["expected"],
-                test_data["criteria"],
-                response_text
-            )
-
-            # Save judge output
-            judge_file = output_dir / f"{safe_model_name}_{test_name}_judge.txt"
-            judge_content = f"""Scores: Correctness={scores['correctness']}, Efficiency={scores['efficiency']}, Outcome={scores['outcome']}
+    while (item := await queue.get()) is not None:
+        model, generated = item
+        safe_model_name = model.replace(":", "_").replace("/", "_")
+        file_prefix = f"{output_dir / safe_model_name}_"
+
+        # Score all of this model's responses at once
+        batch_scores = await get_auto_scores_batch([{
+            "test_name": test_name,
+            "response": response_text
+        } for test_name, (response_text, *_) in generated.items()])
+
+        # Save this model's judge output the same way
+        await asyncio.to_thread(write_files, [(
+            Path(f"{file_prefix}{test_name}_judge.txt"),
+            f"""Scores: Correctness={scores['correctness']}, Efficiency={scores['efficiency']}, Outcome={scores['outcome']}
 Reasoning: {scores['reasoning']}
 
 Raw Judge Response:
 {scores['raw_response']}
 """
-            judge_file.write_text(judge_content)
+        ) for test_name, scores in zip(generated, batch_scores)])
 
+        for (test_name, (_, tokens_per_sec, eval_count, duration_sec)), scores in zip(generated.items(), batch_scores):
             if scores["correctness"] > 0:
                 composite = round((scores["correctness"] + scores["efficiency"] + scores["outcome"]) / 3, 1)
-                model_scores[model][test_name] = composite
-                print_score(composite, scores["correctness"], scores["efficiency"],
-                           scores["outcome"], tokens_per_sec)
                 status = "OK"
             else:
-                print(f" {Colors.RED}SCORING FAILED{Colors.NC}")
                 composite = 0
                 status = "SCORE_FAILED"
 
-            results.append({
+            record_result({
                 "model": model,
                 "test": test_name,
                 "correctness": scores["correctness"],
@@ -437,26 +693,112 @@ Raw Judge Response:
                 "duration": duration_sec,
                 "status": status,
                 "reasoning": scores["reasoning"]
-            })
+            }, writer, model_scores)
+
+            print(f"  {Colors.WHITE}[{next(progress)}/{total_tests}] {model} - {test_name}{Colors.NC}", end="")
+            if status == "OK":
+                print_score(composite, scores["correctness"], scores["efficiency"],
+                            scores["outcome"], tokens_per_sec)
+            else:
+                print(f" {Colors.RED}SCORING FAILED{Colors.NC}")
+
+
+# ═══════════════════════════════════════════════════════════════
+# MAIN EXECUTION
+# ═══════════════════════════════════════════════════════════════
+
+async def run_benchmark(skip_slow: bool = False):
+    # Create output directory
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = Path(f"benchmark_auto_{timestamp}")
+    output_dir.mkdir(exist_ok=True)
+
+    # Initialize results
+    model_scores = {model: {"Reasoning": 0, "Coding": 0, "Logic": 0, "speeds": []}
+                    for model in MODELS}
+    JUDGE_CACHE.update(load_judge_cache())
+
+    # Print header
+    print()
+    print(f"{Colors.CYAN}╔═══════════════════════════════════════════════════════════════╗{Colors.NC}")
+    print(f"{Colors.CYAN}║       OLLAMA BENCHMARK WITH AUTOMATED LLM SCORING             ║{Colors.NC}")
+    print(f"{Colors.CYAN}╠═══════════════════════════════════════════════════════════════╣{Colors.NC}")
+    print(f"{Colors.CYAN}║  Judge Model: {JUDGE_MODEL:<45}║{Colors.NC}")
+    print(f"{Colors.CYAN}║  Models to test: {len(MODELS):<42}║{Colors.NC}")
+    print(f"{Colors.CYAN}║  Tests per model: 3 (Reasoning, Coding, Logic)                ║{Colors.NC}")
+    print(f"{Colors.CYAN}║  Judging: {'alongside generation' if OVERLAP_JUDGING else 'after all generation':<52}║{Colors.NC}")
+    print(f"{Colors.CYAN}╚═══════════════════════════════════════════════════════════════╝{Colors.NC}")
+    print()
+    print(f"{Colors.GRAY}Output directory: {output_dir}{Colors.NC}")
+    print(f"{Colors.GRAY}Cached judge verdicts: {len(JUDGE_CACHE)} ({CACHE_PATH}){Colors.NC}")
+    print()
 
-            time.sleep(2)  # Brief pause between tests
+    # Pre-flight check: verify judge model. Unless judging overlaps generation, unload
+    # it straight away so it doesn't hold memory while the test models are timed.
+    print(f"{Colors.GRAY}Verifying judge model ({JUDGE_MODEL})...{Colors.NC}", end="", flush=True)
+    judge_check = await ollama_generate(JUDGE_MODEL, "Say OK", 30,
+                                        keep_alive=JUDGE_KEEP_ALIVE if OVERLAP_JUDGING else "0")
+
+    if "error" in judge_check:
+        print(f" {Colors.RED}FAILED{Colors.NC}")
+        print()
+        print(f"{Colors.RED}ERROR: Judge model '{JUDGE_MODEL}' failed to respond.{Colors.NC}")
+        print(f"{Colors.RED}Reason: {judge_check['error']}{Colors.NC}")
+        print()
+        print("Possible solutions:")
+        print("  1. Restart Ollama: pkill ollama && ollama serve")
+        print(f"  2. Pull the model: ollama pull {JUDGE_MODEL}")
+        print("  3. Use a smaller judge model by editing JUDGE_MODEL in the script")
+        print()
+        sys.exit(1)
 
+    if not judge_check.get("response"):
+        print(f" {Colors.RED}FAILED{Colors.NC}")
         print()
-        time.sleep(5)  # Pause between models
+        print(f"{Colors.RED}ERROR: Judge model returned empty response.{Colors.NC}")
+        sys.exit(1)
+
+    print(f" {Colors.GREEN}OK{Colors.NC}")
+    print()
+
+    # Run benchmarks. Rows are streamed to the detailed CSV so partial results
+    # survive an interrupted run.
+    csv_file = output_dir / "benchmark_detailed.csv"
+    with open(csv_file, "w", newline="", buffering=1) as f:
+        writer = csv.DictWriter(f, fieldnames=list(CSV_COLUMNS),
+                                quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+        f.write(",".join(CSV_COLUMNS.values()) + "\n")
+
+        queue: asyncio.Queue = asyncio.Queue()
+        progress = itertools.count(1)
+        judge_args = (queue, output_dir, writer, model_scores, progress)
+        if OVERLAP_JUDGING:
+            # Judge each model's responses while the next model generates. The judge
+            # competes with the timed generation, so reported tok/s is lower here.
+            await asyncio.gather(generate_responses(*judge_args, skip_slow),
+                                 *(judge_responses(*judge_args) for _ in range(JUDGE_WORKERS)))
+        else:
+            # Generate everything model by model, then judge in one pass while
+            # only the judge model needs to be loaded
+            unjudged = await generate_responses(*judge_args, skip_slow)
+            print()
+            print(f"{Colors.YELLOW}Judging responses with {JUDGE_MODEL}{Colors.NC}")
+
+            # Load the judge once up front so the first batch doesn't pay for it,
+            # unless every verdict is already cached
+            if unjudged:
+                warmup = await ollama_generate(JUDGE_MODEL, "ok", WARMUP_TIMEOUT, options={"num_predict": 1},
+                                               keep_alive=JUDGE_KEEP_ALIVE)
+                if "error" in warmup:
+                    print(f"{Colors.GRAY}  Judge warm-up failed ({warmup['error']}); continuing{Colors.NC}")
+
+            await asyncio.gather(*(judge_responses(*judge_args) for _ in range(JUDGE_WORKERS)))
+    print()
 
     # ═══════════════════════════════════════════════════════════════
     # RESULTS COMPILATION
     # ═══════════════════════════════════════════════════════════════
 
-    # Write detailed CSV
-    csv_file = output_dir / "benchmark_detailed.csv"
-    with open(csv_file, "w") as f:
-        f.write("Model,Test,Correctness,Efficiency,Outcome,CompositeScore,TokensPerSecond,OutputTokens,Duration,Status,JudgeReasoning\n")
-        for r in results:
-            # Escape quotes in reasoning
-            reasoning = r["reasoning"].replace('"', '""')
-            f.write(f'"{r["model"]}","{r["test"]}",{r["correctness"]},{r["efficiency"]},{r["outcome"]},{r["composite"]},{r["tokens_per_sec"]},{r["output_tokens"]},{r["duration"]},"{r["status"]}","{reasoning}"\n')
-
     # Calculate summaries
     summaries = []
     for model in MODELS:
@@ -466,10 +808,10 @@ Raw Judge Response:
         l_score = scores["Logic"]
 
         valid_scores = [s for s in [r_score, c_score, l_score] if s > 0]
-        avg_score = round(sum(valid_scores) / len(valid_scores), 1) if valid_scores else 0
+        avg_score = round(statistics.fmean(valid_scores), 1) if valid_scores else 0
 
         speeds = scores["speeds"]
-        avg_speed = round(sum(speeds) / len(speeds), 2) if speeds else 0
+        avg_speed = round(statistics.fmean(speeds), 2) if speeds else 0
 
         summaries.append({
             "model": model,
@@ -485,10 +827,11 @@ Raw Judge Response:
 
     # Write summary CSV
     summary_file = output_dir / "benchmark_summary.csv"
-    with open(summary_file, "w") as f:
-        f.write("Model,Reasoning,Coding,Logic,Average,Tok/s\n")
-        for s in summaries:
-            f.write(f'"{s["model"]}",{s["reasoning"]},{s["coding"]},{s["logic"]},{s["average"]},{s["speed"]}\n')
+    with open(summary_file, "w", newline="") as f:
+        f.write(",".join(SUMMARY_COLUMNS.values()) + "\n")
+        summary_writer = csv.DictWriter(f, fieldnames=list(SUMMARY_COLUMNS),
+                                        quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+        summary_writer.writerows(summaries)
 
     # Print results
     print()
@@ -520,24 +863,17 @@ Raw Judge Response:
     for category in ["Reasoning", "Coding", "Logic"]:
         print()
         print(f"  {Colors.CYAN}{category.upper()}:{Colors.NC}")
-        ranked = sorted(
-            [(s["model"], s[category.lower()]) for s in summaries if s[category.lower()] > 0],
-            key=lambda x: x[1],
-            reverse=True
-        )[:5]
-        for model, score in ranked:
-            print(f"    {score:>5}/10  {model}")
+        key = category.lower()
+        ranked = heapq.nlargest(5, (s for s in summaries if s[key] > 0), key=lambda s: s[key])
+        for s in ranked:
+            print(f"    {s[key]:>5}/10  {s['model']}")
 
     # Speed ranking
     print()
     print(f"  {Colors.CYAN}SPEED (Tokens/sec):{Colors.NC}")
-    speed_ranked = sorted(
-        [(s["model"], s["speed"]) for s in summaries if s["speed"] > 0],
-        key=lambda x: x[1],
-        reverse=True
-    )[:5]
-    for model, speed in speed_ranked:
-        print(f"    {speed:>8} tok/s  {model}")
+    speed_ranked = heapq.nlargest(5, (s for s in summaries if s["speed"] > 0), key=lambda s: s["speed"])
+    for s in speed_ranked:
+        print(f"    {s['speed']:>8} tok/s  {s['model']}")
 
     # Best overall
     print()
@@ -559,6 +895,31 @@ Raw Judge Response:
     print()
 
 
+def parse_args() -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Benchmark Ollama models with automated LLM scoring.")
+    parser.add_argument(
+        "--skip-slow",
+        action="store_true",
+        help="time out generations that run far longer than those seen so far in the run, "
+             "and skip the rest of that model's tests"
+    )
+    return parser.parse_args()
+
+
+async def main(skip_slow: bool = False):
+    global SESSION, CACHE_LOCK
+    CACHE_LOCK = asyncio.Lock()
+    SESSION = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE),
+        json_serialize=lambda obj: orjson.dumps(obj).decode()
+    )
+    try:
+        await run_benchmark(skip_slow)
+    finally:
+        await SESSION.close()
+
+
 if __name__ == "__main__":
-    main()
+    asyncio.run(main(parse_args().skip_slow))
 